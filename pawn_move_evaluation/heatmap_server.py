@@ -0,0 +1,139 @@
+import io
+import json
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+import plot_evaluations
+
+# input file and server settings
+input_file = "pawn_moves.json"
+host = "127.0.0.1"
+port = 8000
+num_workers = 8
+
+# number of cached (color, move number range) queries
+cache_size = 1024
+
+# the served boards keep the 10 inch layout of plot_evaluations.py at 600x600 pixels,
+# a lower resolution than the 1000x1000 pixels of the script keeps a cold render below 100 ms
+dpi = 60
+
+# move number ranges rendered for both colors at startup, so that they are never cold
+prewarm_ranges = [(1,1000),(2,10),(1,10),(11,20),(21,30),(31,40)]
+
+class Aggregates:
+  # accuracies of every move sorted by move number, with cumulative sums,
+  # so that the mean over any move number range is two binary searches
+  def __init__(self,data):
+    self.moves = {}
+    for color in data:
+      self.moves[color] = {}
+      for key in data[color]['acc']:
+        num = np.asarray(data[color]['num'][key],dtype=np.int64)
+        acc = np.asarray(data[color]['acc'][key],dtype=np.float64)
+        order = np.argsort(num,kind='stable')
+        cumsum = np.concatenate(([0.],np.cumsum(acc[order])))
+        self.moves[color][key] = (num[order],cumsum)
+
+    # the caches are bound to the instance
+    self.accuracy = functools.lru_cache(maxsize=cache_size)(self.accuracy)
+    self.heatmap = functools.lru_cache(maxsize=cache_size)(self.heatmap)
+
+  def accuracy(self,color,first,last):
+    # same results as plot_evaluations.synthesise
+    results = {}
+    for key,(num,cumsum) in self.moves[color].items():
+      lo = np.searchsorted(num,first,side='left')
+      hi = np.searchsorted(num,last,side='right')
+      results[key] = (cumsum[hi]-cumsum[lo])/(hi-lo) if hi > lo else np.nan
+    return results
+
+  def heatmap(self,color,first,last):
+    # a figure without pyplot, so that several can be rendered concurrently
+    fig = Figure(figsize=[10,10],dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    plot_evaluations.draw_board(ax,self.accuracy(color,first,last),color)
+    buffer = io.BytesIO()
+    fig.savefig(buffer,format='png')
+    return buffer.getvalue()
+
+  def prewarm(self,ranges):
+    # renders are bound by the GIL and cannot run in parallel, so the common ones are done upfront
+    for color in self.moves:
+      for first,last in ranges:
+        self.heatmap(color,first,last)
+
+class PooledHTTPServer(HTTPServer):
+  # requests are handled by a fixed pool of worker threads
+  def __init__(self,server_address,handler_class,aggregates,num_workers):
+    super().__init__(server_address,handler_class)
+    self.aggregates = aggregates
+    self.executor = ThreadPoolExecutor(max_workers=num_workers)
+
+  def process_request(self,request,client_address):
+    self.executor.submit(self.process_request_worker,request,client_address)
+
+  def process_request_worker(self,request,client_address):
+    try:
+      self.finish_request(request,client_address)
+    except Exception:
+      self.handle_error(request,client_address)
+    finally:
+      self.shutdown_request(request)
+
+  def server_close(self):
+    super().server_close()
+    self.executor.shutdown(wait=True)
+
+class HeatmapHandler(BaseHTTPRequestHandler):
+  # GET /accuracy?color=white&from=2&to=10 returns the mean accuracies as json
+  # GET /heatmap.png?color=white&from=2&to=10 returns the rendered board
+  def do_GET(self):
+    url = urlparse(self.path)
+    query = parse_qs(url.query)
+    try:
+      color = query.get('color',['white'])[0]
+      first = int(query.get('from',['1'])[0])
+      last = int(query.get('to',['1000'])[0])
+      if color not in self.server.aggregates.moves:
+        raise ValueError(f"unknown color {color}")
+    except ValueError as error:
+      self.send_error(400,str(error))
+      return
+
+    if url.path == '/accuracy':
+      results = self.server.aggregates.accuracy(color,first,last)
+      body = json.dumps({key: None if np.isnan(value) else value for key,value in results.items()}).encode()
+      self.reply(body,'application/json')
+    elif url.path == '/heatmap.png':
+      self.reply(self.server.aggregates.heatmap(color,first,last),'image/png')
+    else:
+      self.send_error(404)
+
+  def reply(self,body,content_type):
+    self.send_response(200)
+    self.send_header('Content-Type',content_type)
+    self.send_header('Content-Length',str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+if __name__ == "__main__":
+  # load the aggregated results once
+  aggregates = Aggregates(plot_evaluations.load_data(input_file))
+  aggregates.prewarm(prewarm_ranges)
+
+  server = PooledHTTPServer((host,port),HeatmapHandler,aggregates,num_workers)
+  print(f"serving on http://{host}:{port}")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
@@ -0,0 +1,6 @@
+import pawn_move_evaluation
+
+# combine the partial results of pawn_move_evaluation.py into the cumulative
+# results read by plot_evaluations.py, without touching the raw pgn files
+if __name__ == "__main__":
+  pawn_move_evaluation.merge_partials(pawn_move_evaluation.partials_folder,pawn_move_evaluation.output_file)
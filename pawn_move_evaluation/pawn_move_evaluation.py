@@ -3,12 +3,16 @@ import chess.pgn
 import re
 import numpy as np
 import json
+import hashlib
+import glob
+import os
 
 import common
 
 # input/output file
 input_file = "data_path.json"
 output_file = "pawn_moves.json"
+partials_folder = "partials"
 
 # games to be extracted from
 total_games = 1e6
@@ -16,7 +20,6 @@ total_games = 1e6
 starting_eval = str(0.3) # for consistency with the rest of evals
 
 def parse_time_remaining(comment):
-  print(comment)
   match = re.search(r"\[%clk\s(\d{1}:\d{2}:\d{2})\]", comment)
   if match:
     return match.group(1)
@@ -68,15 +71,15 @@ def move_accuracy(eval_old,eval,side_to_move):
     raw = 103.1668100711649 * np.exp(-0.04354415386753951*win_diff) -3.166924740191411
     return min(100,max(0,raw+1)) # + 1  uncertainty bonus (due to imperfect analysis)
 
-def play_through_game(game,resdict):
+def play_through_moves(moves,evals,resdict):
   board = chess.Board()
   eval = starting_eval
 
-  # iterate through each node and move in the game
-  for node,move in zip(game.mainline(),game.mainline_moves()):
+  # iterate through each move and its eval in the game
+  for move,node_eval in zip(moves,evals):
       # store old and get the current eval
       eval_old = eval
-      eval = parse_evaluation(node.comment)
+      eval = node_eval
 
       # skip without eval, this should happen only for the final move
       if eval is None:
@@ -102,27 +105,30 @@ def play_through_game(game,resdict):
     
   return
 
-if __name__ == "__main__":
+def play_through_game(game,resdict):
+  evals = [parse_evaluation(node.comment) for node in game.mainline()]
+  play_through_moves(game.mainline_moves(),evals,resdict)
+
+def new_resdict():
   # instantiate dictionaries of results
   resdict = {}
-  resdict['white'] = {}
-  resdict['black'] = {}
-  resdict['white']['acc'] = {}
-  resdict['white']['num'] = {}
-  resdict['black']['acc'] = {}
-  resdict['black']['num'] = {}
-
-  for move in common.pawn_moves['white']:
-    resdict['white']['acc'][move] = []
-    resdict['white']['num'][move] = []
-
-  for move in common.pawn_moves['black']:
-    resdict['black']['acc'][move] = []
-    resdict['black']['num'][move] = []
-
-  # read the file path of the game database
-  with open(input_file,'r') as infile:
-    file_path = json.load(infile)
+  for color in ['white','black']:
+    resdict[color] = {'acc': {}, 'num': {}}
+    for move in common.pawn_moves[color]:
+      resdict[color]['acc'][move] = []
+      resdict[color]['num'][move] = []
+  return resdict
+
+def merge_resdicts(resdict,other):
+  # append the results of other to resdict in place
+  for color in other:
+    for key in other[color]:
+      for move in other[color][key]:
+        resdict[color][key][move].extend(other[color][key][move])
+  return resdict
+
+def evaluate_file(file_path,total_games):
+  resdict = new_resdict()
 
   # start pgn read
   pgn = open(file_path)
@@ -133,7 +139,7 @@ if __name__ == "__main__":
   ievl = 0
 
   # while loop to evaluate
-  while game is not None and ievl<total_games:
+  while game is not None and (total_games is None or ievl<total_games):
     # increment counter
     iall += 1
     # check if game was analysed
@@ -149,8 +155,116 @@ if __name__ == "__main__":
     # proceed to read next game
     game = chess.pgn.read_game(pgn)
 
+  pgn.close()
+
+  # complete when the whole file was read, not stopped by total_games
+  counts = {
+    'games_read': iall,
+    'games_evaluated': ievl,
+    'total_games': total_games,
+    'complete': game is None,
+  }
+  return resdict,counts
+
+def file_hash(file_path):
+  # sha256 of the whole file, read in chunks
+  sha = hashlib.sha256()
+  with open(file_path,'rb') as infile:
+    for chunk in iter(lambda: infile.read(1 << 24), b''):
+      sha.update(chunk)
+  return sha.hexdigest()
+
+def file_fingerprint(file_path,partial=None):
+  # the hash of the partial is reused while the size and modification time
+  # of the file are unchanged, so that processed dumps are not read again
+  stat = os.stat(file_path)
+  fingerprint = {
+    'source': os.path.basename(file_path),
+    'size': stat.st_size,
+    'mtime_ns': stat.st_mtime_ns,
+  }
+  if partial is not None and partial.get('size') == stat.st_size and partial.get('mtime_ns') == stat.st_mtime_ns:
+    fingerprint['sha256'] = partial['sha256']
+  else:
+    fingerprint['sha256'] = file_hash(file_path)
+  return fingerprint
+
+def partial_up_to_date(partial,fingerprint,total_games):
+  # a partial is reused if it was computed from the same file with the same
+  # total_games, or from the whole file with no more games than total_games
+  if partial is None or partial['sha256'] != fingerprint['sha256']:
+    return False
+  if partial.get('complete'):
+    return total_games is None or partial['games_evaluated'] <= total_games
+  return partial.get('total_games') == total_games and partial.get('total_games_read') is None
+
+def partial_path(folder,source):
+  # the partial of an input file is named after the file
+  return os.path.join(folder,f"{source}.json")
+
+def load_partial(folder,source):
+  # the partial of a single input file, None if it was not processed yet
+  if not os.path.exists(partial_path(folder,source)):
+    return None
+  with open(partial_path(folder,source),'r') as infile:
+    return json.load(infile)
+
+def load_partials(folder):
+  # every partial holds the results of a single input file
+  partials = []
+  sources = set()
+  for json_path in sorted(glob.glob(os.path.join(folder,'*.json'))):
+    with open(json_path,'r') as infile:
+      partial = json.load(infile)
+    if partial['source'] in sources:
+      raise ValueError(f"more than one partial for {partial['source']} in {folder}")
+    sources.add(partial['source'])
+    partials.append(partial)
+  return partials
+
+def write_partial(folder,fingerprint,resdict,counts):
+  partial = {**fingerprint, **counts, 'results': resdict}
+  os.makedirs(folder,exist_ok=True)
+
+  # replaces any previous partial of the same source
+  with open(partial_path(folder,fingerprint['source']),'w') as outfile:
+    outfile.write(json.dumps(partial,indent=2))
+
+def merge_partials(folder,output_file):
+  # combine the partials into the cumulative results, without reading any pgn
+  resdict = new_resdict()
+  partials = load_partials(folder)
+  for partial in partials:
+    merge_resdicts(resdict,partial['results'])
+    print(partial['source'],partial['games_read'],partial['games_evaluated'])
+
   # write results to json
   json_dump = json.dumps(resdict,indent=2)
   with open(output_file,'w') as outfile:
     outfile.write(json_dump)
-  
\ No newline at end of file
+  return resdict
+
+if __name__ == "__main__":
+  # read the file path(s) of the game database, e.g. one per monthly dump
+  with open(input_file,'r') as infile:
+    file_paths = json.load(infile)
+  if isinstance(file_paths,str):
+    file_paths = [file_paths]
+
+  for file_path in file_paths:
+    partial = load_partial(partials_folder,os.path.basename(file_path))
+    fingerprint = file_fingerprint(file_path,partial)
+
+    # files with an up to date partial are skipped
+    if partial_up_to_date(partial,fingerprint,total_games):
+      print(f"skipping {file_path}, already processed")
+      if partial.get('size') != fingerprint['size'] or partial.get('mtime_ns') != fingerprint['mtime_ns']:
+        # same content, store the new size and modification time
+        counts = {key: value for key,value in partial.items() if key not in fingerprint and key != 'results'}
+        write_partial(partials_folder,fingerprint,partial['results'],counts)
+      continue
+
+    resdict,counts = evaluate_file(file_path,total_games)
+    write_partial(partials_folder,fingerprint,resdict,counts)
+
+  merge_partials(partials_folder,output_file)
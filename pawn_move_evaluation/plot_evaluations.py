@@ -5,105 +5,126 @@ import matplotlib.pyplot as plt
 import chess
 import chess.pgn
 
-# -- load the data
 input_file = "pawn_moves.json"
-with open(input_file,'r') as infile:
-  data = json.load(infile)
-
-# -- select color and other custom selection
-color = 'white'
-if color == 'white':
-  starting_rank = 6
-  starting_rank_correction = 0.25
-else:
-  starting_rank = 1 # rank number is flipped!
-  starting_rank_correction = -0.25
-
-move_number_range = (2,10)
-name = color+f"_{move_number_range[0]}_{move_number_range[1]}"
-
-# -- synthetise data
-results = {key: None for key in data[color]['acc']}
-for key in results:
-  indices = [move_number_range[0] <= n <= move_number_range[1] for n in data[color]['num'][key]]
-  temp = [element for element, boolean in zip(data[color]['acc'][key], indices) if boolean]
-  if len(temp)>0:
-    results[key] = sum(temp)/len(temp)
-  else:
-    results[key] = np.nan
 
-# -- plotting the chess board
+# -- plotting parameters
 blackval = 0.95
 whiteval = 1.
 value_min = 0.
 value_max = 1.
 
-brdplot = np.array([[whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
-                    [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
-                    [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
-                    [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
-                    [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
-                    [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
-                    [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
-                    [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval]])
-
-fig,ax = plt.subplots(figsize=[10,10])
-plt.imshow(brdplot, cmap="gray",vmin=value_min,vmax=value_max)
-
-# -- set the borders to a given color
-ax.tick_params(color=str(blackval), labelcolor=str(blackval))
-for spine in ax.spines.values():
-  spine.set_edgecolor(str(blackval))
-
-# -- add rank and file labels
-# rank labels on the left side and the right side
-for i in range(8):
-  ax.text(-1, i, str(8 - i), ha='center', va='center', fontsize=14)
-  ax.text(8, i, str(8 - i), ha='center', va='center', fontsize=14)
-
-# file labels on the top and bottom
-for j in range(8):
-  ax.text(j, -1, chr(97 + j), ha='center', va='center', fontsize=14)
-  ax.text(j, 8, chr(97 + j), ha='center', va='center', fontsize=14)
-
-plt.xticks([])
-plt.yticks([])
-
-# -- we will need some colors for prettier visualisation
 cmap = 'magma_r'
 cmap_r = 'magma'
-norm = matplotlib.colors.Normalize(vmin=75, vmax=100) 
-sm = matplotlib.cm.ScalarMappable(cmap=cmap, norm=norm)
-sm_r = matplotlib.cm.ScalarMappable(cmap=cmap_r, norm=norm)
-
-# -- write results
 digits = 1
-for key in results:
-  move = chess.Move.from_uci(key)
-  fr_sq_x = chess.square_file(chess.square_mirror(move.from_square))
-  fr_sq_y = chess.square_rank(chess.square_mirror(move.from_square))
-  to_sq_x = chess.square_file(chess.square_mirror(move.to_square))
-  to_sq_y = chess.square_rank(chess.square_mirror(move.to_square))
-
-  rect_x = fr_sq_x-0.5
-  rect_y = fr_sq_y-0.5
-  rect_xl = 1.
-  rect_yl = 1.
-
-  if fr_sq_y == starting_rank:
-    if abs(to_sq_y-fr_sq_y)<2:
-      # the sign is again inverted here!
-      rect_y = fr_sq_y
-      rect_yl = 0.5
-      fr_sq_y = fr_sq_y+starting_rank_correction
+
+def load_data(input_file):
+  with open(input_file,'r') as infile:
+    return json.load(infile)
+
+def starting_rank_of(color):
+  if color == 'white':
+    return 6, 0.25
+  else:
+    return 1, -0.25 # rank number is flipped!
+
+def synthesise(data,color,move_number_range):
+  results = {key: None for key in data[color]['acc']}
+  for key in results:
+    indices = [move_number_range[0] <= n <= move_number_range[1] for n in data[color]['num'][key]]
+    temp = [element for element, boolean in zip(data[color]['acc'][key], indices) if boolean]
+    if len(temp)>0:
+      results[key] = sum(temp)/len(temp)
     else:
-      rect_yl = 0.5
-      fr_sq_y = fr_sq_y-starting_rank_correction
-   
-  if results[key] is not np.nan:
-    rect = matplotlib.patches.Rectangle((rect_x,rect_y), rect_xl, rect_yl, color='none', fc=sm.to_rgba(results[key]),alpha=0.5)
-    ax.add_patch(rect)
-    ax.text(fr_sq_x,fr_sq_y, format(results[key], f".{digits}f"), ha='center', va='center', fontsize=14,color=sm_r.to_rgba(results[key]))
-
-plt.savefig(name+".png")
-plt.show()
+      results[key] = np.nan
+  return results
+
+def draw_board(ax,results,color):
+  # only the axes are used, so that boards can be drawn outside of pyplot too
+  starting_rank, starting_rank_correction = starting_rank_of(color)
+
+  # -- plotting the chess board
+  brdplot = np.array([[whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
+                      [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
+                      [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
+                      [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
+                      [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
+                      [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval],
+                      [whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval],
+                      [blackval,whiteval,blackval,whiteval,blackval,whiteval,blackval,whiteval]])
+
+  ax.imshow(brdplot, cmap="gray",vmin=value_min,vmax=value_max)
+
+  # -- set the borders to a given color
+  ax.tick_params(color=str(blackval), labelcolor=str(blackval))
+  for spine in ax.spines.values():
+    spine.set_edgecolor(str(blackval))
+
+  # -- add rank and file labels
+  # rank labels on the left side and the right side
+  for i in range(8):
+    ax.text(-1, i, str(8 - i), ha='center', va='center', fontsize=14)
+    ax.text(8, i, str(8 - i), ha='center', va='center', fontsize=14)
+
+  # file labels on the top and bottom
+  for j in range(8):
+    ax.text(j, -1, chr(97 + j), ha='center', va='center', fontsize=14)
+    ax.text(j, 8, chr(97 + j), ha='center', va='center', fontsize=14)
+
+  ax.set_xticks([])
+  ax.set_yticks([])
+
+  # -- we will need some colors for prettier visualisation
+  norm = matplotlib.colors.Normalize(vmin=75, vmax=100) 
+  sm = matplotlib.cm.ScalarMappable(cmap=cmap, norm=norm)
+  sm_r = matplotlib.cm.ScalarMappable(cmap=cmap_r, norm=norm)
+
+  # -- write results
+  # the colors are mapped at once, and the squares lie within the board so the data limits need no update
+  keys = [key for key in results if not np.isnan(results[key])]
+  values = np.array([results[key] for key in keys])
+  facecolors = sm.to_rgba(values)
+  textcolors = sm_r.to_rgba(values)
+
+  for key,value,facecolor,textcolor in zip(keys,values,facecolors,textcolors):
+    move = chess.Move.from_uci(key)
+    fr_sq_x = chess.square_file(chess.square_mirror(move.from_square))
+    fr_sq_y = chess.square_rank(chess.square_mirror(move.from_square))
+    to_sq_x = chess.square_file(chess.square_mirror(move.to_square))
+    to_sq_y = chess.square_rank(chess.square_mirror(move.to_square))
+
+    rect_x = fr_sq_x-0.5
+    rect_y = fr_sq_y-0.5
+    rect_xl = 1.
+    rect_yl = 1.
+
+    if fr_sq_y == starting_rank:
+      if abs(to_sq_y-fr_sq_y)<2:
+        # the sign is again inverted here!
+        rect_y = fr_sq_y
+        rect_yl = 0.5
+        fr_sq_y = fr_sq_y+starting_rank_correction
+      else:
+        rect_yl = 0.5
+        fr_sq_y = fr_sq_y-starting_rank_correction
+
+    rect = matplotlib.patches.Rectangle((rect_x,rect_y), rect_xl, rect_yl, color='none', fc=facecolor,alpha=0.5)
+    ax.add_artist(rect)
+    ax.text(fr_sq_x,fr_sq_y, format(value, f".{digits}f"), ha='center', va='center', fontsize=14,color=textcolor)
+
+if __name__ == "__main__":
+  # -- load the data
+  data = load_data(input_file)
+
+  # -- select color and other custom selection
+  color = 'white'
+  move_number_range = (2,10)
+  name = color+f"_{move_number_range[0]}_{move_number_range[1]}"
+
+  # -- synthetise data
+  results = synthesise(data,color,move_number_range)
+
+  fig,ax = plt.subplots(figsize=[10,10])
+  draw_board(ax,results,color)
+
+  plt.savefig(name+".png")
+  plt.show()
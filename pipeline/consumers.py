@@ -0,0 +1,297 @@
+import os
+import sys
+import abc
+import shutil
+from pathlib import Path
+
+import chess
+import numpy as np
+import pandas as pd
+
+# the consumers reuse the code of the individual analyses
+repo_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repo_root / "pawn_move_evaluation"))
+sys.path.insert(0, str(repo_root / "win_predictor" / "data_prep"))
+
+import pawn_move_evaluation
+import select_games
+import generate_csv
+import generate_images
+
+
+# the games are selected with the same tag file as select_games.py
+tag_file_path = repo_root / "data" / "tag_file"
+tag_headers_match = None
+
+def selected_game(game) -> bool:
+    """
+    Determines whether a parsed game meets the criteria of the tag file and has an evaluation of the first move, as select_games.py does.
+
+    Args:
+        game (ParsedGame): The parsed game.
+
+    Returns:
+        bool: True if the game should be selected, False otherwise.
+    """
+    # compiled once per process, the compiled predicates cannot be sent to the workers
+    global tag_headers_match
+    if tag_headers_match is None:
+        tag_headers_match = select_games.compile_tag_criteria(select_games.load_tag_file(tag_file_path))
+    return tag_headers_match(game.header_block.encode()) and len(game.evals) > 0 and game.evals[0] is not None
+
+
+class Consumer(abc.ABC):
+    """
+    Base class of the consumers fed by run_pipeline.
+
+    A consumer is used in two roles. In the workers, consume is called for every parsed game and flush returns the partial result of the games consumed since the last flush.
+    In the main process, merge is called with every partial result in the order of the games in the dump.
+    Once the dump has been read, finish is called to put the outputs in place, with whether the end of the dump was reached or the scan was stopped by total_games. If the scan fails or is interrupted, abort is called instead and no output should look finished.
+    Consumers are pickled to the workers, so they should not open any files before the first merge.
+    """
+    @abc.abstractmethod
+    def consume(self, game) -> None:
+        pass
+
+    @abc.abstractmethod
+    def flush(self):
+        pass
+
+    @abc.abstractmethod
+    def merge(self, partial) -> None:
+        pass
+
+    def finish(self, end_of_file: bool) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+
+class FilterWriter(Consumer):
+    """
+    Write the games meeting a condition to a PGN file, as done by select_games.filter_raw_and_write_to_pgn.
+
+    The games are written to a temporary file, which replaces the output PGN file once the dump has been read.
+
+    Args:
+        output_pgn_path (str): The file path of the output PGN file.
+        condition_func (function): A function that takes a parsed game and returns True if the game should be written.
+        total_games (int): The maximum number of games to be written.
+    """
+    def __init__(self, output_pgn_path, condition_func=selected_game, total_games=select_games.total_games):
+        self.output_pgn_path = output_pgn_path
+        self.condition_func = condition_func
+        self.total_games = total_games
+        self.selected = []
+        self.written = 0
+        self.temporary_pgn_path = f"{output_pgn_path}.part"
+        self.output_file = None
+
+    def consume(self, game) -> None:
+        if self.condition_func(game):
+            self.selected.append(game.text)
+
+    def flush(self):
+        selected, self.selected = self.selected, []
+        return selected
+
+    def merge(self, partial) -> None:
+        if self.output_file is None:
+            self.output_file = open(self.temporary_pgn_path, 'w')
+        for text in partial[:max(0, int(self.total_games) - self.written)]:
+            self.output_file.write(text + '\n')
+            self.written += 1
+
+    def finish(self, end_of_file: bool) -> None:
+        if self.output_file is None:
+            self.output_file = open(self.temporary_pgn_path, 'w')
+        self.output_file.close()
+        os.replace(self.temporary_pgn_path, self.output_pgn_path)
+
+    def abort(self) -> None:
+        if self.output_file is not None:
+            self.output_file.close()
+            os.remove(self.temporary_pgn_path)
+
+
+class PawnAccuracy(Consumer):
+    """
+    Aggregate the accuracy of pawn moves of analysed games, as done by pawn_move_evaluation.py.
+
+    The results of the dump are written as its partial result, replacing any previous partial of the same dump, and all the partials are then merged into the cumulative results.
+
+    Args:
+        input_pgn_path (str): The file path of the dump, recorded in the partial result.
+        total_games (int or None): The maximum number of games read by run_pipeline, None for the whole dump.
+        partials_folder (Path): The folder of the partial results of pawn_move_evaluation.py.
+        output_file (Path): The path of the JSON file the cumulative results are written to.
+    """
+    def __init__(self, input_pgn_path, total_games=None,
+                 partials_folder=repo_root / "pawn_move_evaluation" / pawn_move_evaluation.partials_folder,
+                 output_file=repo_root / "pawn_move_evaluation" / pawn_move_evaluation.output_file):
+        self.input_pgn_path = input_pgn_path
+        self.total_games = total_games
+        self.partials_folder = str(partials_folder)
+        self.output_file = output_file
+        self.resdict = pawn_move_evaluation.new_resdict()
+        self.consumed_games = 0
+        self.evaluated_games = 0
+        self.total = pawn_move_evaluation.new_resdict()
+        self.games_read = 0
+        self.games_evaluated = 0
+
+    def consume(self, game) -> None:
+        self.consumed_games += 1
+        # check if game was analysed
+        if len(game.evals) > 0 and game.evals[0] is not None:
+            self.evaluated_games += 1
+            moves = [chess.Move.from_uci(move) for move in game.moves]
+            pawn_move_evaluation.play_through_moves(moves, game.evals, self.resdict)
+
+    def flush(self):
+        partial = (self.resdict, self.consumed_games, self.evaluated_games)
+        self.resdict = pawn_move_evaluation.new_resdict()
+        self.consumed_games = 0
+        self.evaluated_games = 0
+        return partial
+
+    def merge(self, partial) -> None:
+        resdict, games_read, games_evaluated = partial
+        pawn_move_evaluation.merge_resdicts(self.total, resdict)
+        self.games_read += games_read
+        self.games_evaluated += games_evaluated
+
+    def finish(self, end_of_file: bool) -> None:
+        # the number of evaluated games is not capped, only the number of games read
+        counts = {
+            'games_read': self.games_read,
+            'games_evaluated': self.games_evaluated,
+            'total_games': None,
+            'total_games_read': None if end_of_file else self.total_games,
+            'complete': end_of_file,
+        }
+        previous = pawn_move_evaluation.load_partial(self.partials_folder, os.path.basename(self.input_pgn_path))
+        fingerprint = pawn_move_evaluation.file_fingerprint(self.input_pgn_path, previous)
+        pawn_move_evaluation.write_partial(self.partials_folder, fingerprint, self.total, counts)
+        pawn_move_evaluation.merge_partials(self.partials_folder, self.output_file)
+
+
+class DatasetEncoder(Consumer):
+    """
+    Base class of the consumers encoding the selected games into train and valid datasets.
+
+    The first total_train_games selected games go to the train dataset and the next total_valid_games to the valid dataset, as done by generate_csv.py and generate_images.py.
+    The workers only pass on the moves and the result of the selected games, the games are encoded in the main process while the datasets are not full yet.
+
+    Args:
+        root_output_folder (Path): The folder the datasets are written to.
+        total_train_games (int): The number of games in the train dataset.
+        total_valid_games (int): The number of games in the valid dataset.
+        condition_func (function): A function that takes a parsed game and returns True if the game should be encoded.
+    """
+    def __init__(self, root_output_folder, total_train_games, total_valid_games, condition_func=selected_game):
+        self.root_output_folder = Path(root_output_folder)
+        self.total_train_games = total_train_games
+        self.total_valid_games = total_valid_games
+        self.condition_func = condition_func
+        self.selected = []
+        self.train_game_number = -1
+        self.valid_game_number = -1
+
+    @abc.abstractmethod
+    def output(self, split: str, game_number: int, moves, result: str) -> None:
+        pass
+
+    def consume(self, game) -> None:
+        if self.condition_func(game):
+            self.selected.append((game.moves, game.headers.get("Result", "")))
+
+    def flush(self):
+        selected, self.selected = self.selected, []
+        return selected
+
+    def merge(self, partial) -> None:
+        # the game counters follow the same convention as the data_prep scripts
+        for uci_moves, result in partial:
+            if self.train_game_number < self.total_train_games:
+                self.train_game_number += 1
+                split, game_number = "train", self.train_game_number
+            elif self.valid_game_number < self.total_valid_games:
+                self.valid_game_number += 1
+                split, game_number = "valid", self.valid_game_number
+            else:
+                return
+            moves = [chess.Move.from_uci(move) for move in uci_moves]
+            self.output(split, game_number, moves, result)
+
+
+class CsvEncoder(DatasetEncoder):
+    """
+    Encode the selected games into train.csv and valid.csv, as done by generate_csv.py.
+
+    The rows are kept in memory and the CSV files are only written once the dump has been read.
+    """
+    def __init__(self, root_output_folder=generate_csv.root_output_folder, total_train_games=generate_csv.total_train_games,
+                 total_valid_games=generate_csv.total_valid_games, condition_func=selected_game):
+        super().__init__(root_output_folder, total_train_games, total_valid_games, condition_func)
+        self.rows = {"train": [], "valid": []}
+
+    def output(self, split: str, game_number: int, moves, result: str) -> None:
+        self.rows[split].append(generate_csv.game_rows(moves, result, game_number))
+
+    def finish(self, end_of_file: bool) -> None:
+        self.root_output_folder.mkdir(parents=True, exist_ok=True)
+        column_names = ['game_no','ply_no'] + [f'f_{i}' for i in range(1, 65)] + ['result']
+        for split, rows in self.rows.items():
+            data = np.concatenate(rows) if rows else np.zeros((0, len(column_names)), dtype=int)
+            pd.DataFrame(data, columns=column_names).to_csv(self.root_output_folder / f"{split}.csv", index=False)
+
+
+class ImageEncoder(DatasetEncoder):
+    """
+    Encode the selected games into the train/{0,1} and valid/{0,1} image folders, as done by generate_images.py.
+
+    The images are written to a staging folder next to root_output_folder, and its train and valid folders replace the previous ones once the dump has been read.
+
+    Args:
+        writer_threads (int): The number of background PNG writers.
+        max_pending_images (int): The maximum number of images waiting to be written.
+    """
+    def __init__(self, root_output_folder=generate_images.root_output_folder, total_train_games=generate_images.total_train_games,
+                 total_valid_games=generate_images.total_valid_games, condition_func=selected_game,
+                 writer_threads=generate_images.writer_threads, max_pending_images=generate_images.max_pending_images):
+        super().__init__(root_output_folder, total_train_games, total_valid_games, condition_func)
+        self.writer_threads = writer_threads
+        self.max_pending_images = max_pending_images
+        self.staging_folder = self.root_output_folder.with_name(self.root_output_folder.name + ".part")
+        self.writer = None
+
+    def output(self, split: str, game_number: int, moves, result: str) -> None:
+        if self.writer is None:
+            self.start()
+        board_arrays, side_wins = generate_images.game_arrays(moves, result)
+        generate_images.output_states(board_arrays, side_wins, self.staging_folder / split, game_number, self.writer)
+
+    def start(self) -> None:
+        # leftovers of an earlier run are not mixed into the new images
+        shutil.rmtree(self.staging_folder, ignore_errors=True)
+        for split_name in ["train", "valid"]:
+            for label in ["0", "1"]:
+                (self.staging_folder / split_name / label).mkdir(parents=True, exist_ok=True)
+        self.writer = generate_images.ImageWriter(self.writer_threads, self.max_pending_images)
+
+    def finish(self, end_of_file: bool) -> None:
+        if self.writer is None:
+            self.start()
+        self.writer.close()
+        self.root_output_folder.mkdir(parents=True, exist_ok=True)
+        for split_name in ["train", "valid"]:
+            shutil.rmtree(self.root_output_folder / split_name, ignore_errors=True)
+            os.replace(self.staging_folder / split_name, self.root_output_folder / split_name)
+        self.staging_folder.rmdir()
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.close(raise_errors=False)
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
@@ -0,0 +1,166 @@
+import os
+import json
+import shutil
+from pathlib import Path
+
+import chess
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import consumers
+import run_pipeline
+
+# input/output file
+input_file = "data_path.json"
+output_folder = Path("../data/moves")
+
+# games to be exported, None for the whole dump
+total_games = None
+
+# games written to a single partition file
+games_per_partition = 100_000
+
+schema = pa.schema([
+    ("game_id", pa.string()),
+    ("ply", pa.int16()),
+    ("uci", pa.string()),
+    ("piece", pa.int8()),
+    ("eval_cp", pa.int16()),
+    ("mate", pa.int16()),
+    ("clock_s", pa.int32()),
+    ("white_to_move", pa.bool_()),
+])
+
+int16_limit = np.iinfo(np.int16).max
+
+
+def parse_eval(eval):
+    """
+    Converts an evaluation from a %eval comment into centipawns or mate distance.
+
+    Args:
+        eval (str or None): The evaluation, e.g. "0.35" or "#-3".
+
+    Returns:
+        tuple: The evaluation in centipawns and the signed number of moves to mate, None where not applicable.
+
+    Example:
+        parse_eval("0.35")  # (35, None)
+        parse_eval("#-3")   # (None, -3)
+    """
+    if eval is None:
+        return None, None
+    if eval[0] == '#':
+        return None, int(eval[1:])
+    centipawns = int(round(float(eval) * 100))
+    return max(-int16_limit, min(int16_limit, centipawns)), None
+
+def parse_clock(clock):
+    """
+    Converts the time remaining from a %clk comment into seconds.
+
+    Args:
+        clock (str or None): The time remaining in the format H:MM:SS.
+
+    Returns:
+        int or None: The time remaining in seconds.
+    """
+    if clock is None:
+        return None
+    hours, minutes, seconds = clock.split(':')
+    return 3600 * int(hours) + 60 * int(minutes) + int(seconds)
+
+def game_id(headers):
+    # the Lichess game id is the last part of the Site url
+    site = headers.get("Site", "")
+    return site.rsplit('/', 1)[-1] or None
+
+
+class MoveTableWriter(consumers.Consumer):
+    """
+    Export every move of the dump into a columnar table of Parquet partitions.
+
+    Each row holds the game id, the ply before the move, the move in UCI notation, the type of the moving piece, the evaluation after the move in centipawns or as mate distance, the clock of the moving side in seconds and the side to move.
+    The partitions are written in the order of the games in the dump and can be scanned together with pyarrow.dataset or pandas.read_parquet.
+    They are written to a staging folder next to output_folder, which replaces output_folder once the dump has been read, so no partition of an earlier run is left behind.
+
+    Args:
+        output_folder (Path): The folder the partition files are written to.
+        games_per_partition (int): The number of games written to a single partition file.
+    """
+    def __init__(self, output_folder=output_folder, games_per_partition=games_per_partition):
+        self.output_folder = Path(output_folder)
+        self.games_per_partition = games_per_partition
+        self.columns = {name: [] for name in schema.names}
+        self.consumed_games = 0
+        self.pending = []
+        self.pending_games = 0
+        self.partition_number = 0
+        self.staging_folder = self.output_folder.with_name(self.output_folder.name + ".part")
+        self.started = False
+
+    def consume(self, game) -> None:
+        board = chess.Board()
+        self.consumed_games += 1
+        for ply, (uci, eval, clock) in enumerate(zip(game.moves, game.evals, game.clocks)):
+            move = chess.Move.from_uci(uci)
+            eval_cp, mate = parse_eval(eval)
+            self.columns["game_id"].append(game_id(game.headers))
+            self.columns["ply"].append(ply)
+            self.columns["uci"].append(uci)
+            self.columns["piece"].append(board.piece_type_at(move.from_square))
+            self.columns["eval_cp"].append(eval_cp)
+            self.columns["mate"].append(mate)
+            self.columns["clock_s"].append(parse_clock(clock))
+            self.columns["white_to_move"].append(board.turn == chess.WHITE)
+            board.push(move)
+
+    def flush(self):
+        table = pa.Table.from_pydict(self.columns, schema=schema)
+        partial = (self.consumed_games, table)
+        self.columns = {name: [] for name in schema.names}
+        self.consumed_games = 0
+        return partial
+
+    def merge(self, partial) -> None:
+        num_games, table = partial
+        self.pending.append(table)
+        self.pending_games += num_games
+        if self.pending_games >= self.games_per_partition:
+            self.write_partition()
+
+    def write_partition(self) -> None:
+        if not self.pending:
+            return
+        if not self.started:
+            self.start()
+        pq.write_table(pa.concat_tables(self.pending), self.staging_folder / f"part-{self.partition_number:05d}.parquet")
+        self.partition_number += 1
+        self.pending = []
+        self.pending_games = 0
+
+    def start(self) -> None:
+        # leftovers of an earlier run are not mixed into the new partitions
+        shutil.rmtree(self.staging_folder, ignore_errors=True)
+        self.staging_folder.mkdir(parents=True)
+        self.started = True
+
+    def finish(self, end_of_file: bool) -> None:
+        self.write_partition()
+        if not self.started:
+            self.start()
+        shutil.rmtree(self.output_folder, ignore_errors=True)
+        os.replace(self.staging_folder, self.output_folder)
+
+    def abort(self) -> None:
+        if self.started:
+            shutil.rmtree(self.staging_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    # read the file path of the game database
+    with open(input_file,'r') as infile:
+        input_pgn_path = json.load(infile)
+
+    run_pipeline.run_pipeline(input_pgn_path, [MoveTableWriter()], run_pipeline.num_workers, run_pipeline.batch_size, total_games)
@@ -0,0 +1,201 @@
+import io
+import re
+import json
+from collections import namedtuple
+from itertools import islice
+from multiprocessing import Pool
+
+import chess.pgn
+
+import consumers
+import select_games
+
+# input/output file
+input_file = "data_path.json"
+
+# games to be read from the dump, None for the whole dump
+total_games = 1e6
+
+# number of worker processes and the number of games sent to a worker at once
+num_workers = 4
+batch_size = 1000
+
+eval_pattern = re.compile(r"\[%eval\s(.+?)\]")
+
+ParsedGame = namedtuple("ParsedGame", ["text", "header_block", "headers", "moves", "evals", "clocks"])
+ParsedGame.__doc__ = """
+A game of the dump parsed once and shared by all the consumers.
+
+Fields:
+    text (str): The raw PGN text of the game.
+    header_block (str): The raw header lines of the game.
+    headers (dict): The PGN headers of the game.
+    moves (list[str]): The mainline moves in UCI notation.
+    evals (list[str or None]): The evaluation after each move, as found in the %eval comments.
+    clocks (list[str or None]): The time remaining after each move, as found in the %clk comments.
+"""
+
+
+def parse_game(header_block: str, movetext: str) -> ParsedGame:
+    """
+    Parses the raw PGN text of a single game.
+
+    Args:
+        header_block (str): The raw header lines of the game.
+        movetext (str): The raw movetext of the game.
+
+    Returns:
+        ParsedGame or None: The parsed game, or None if the text does not contain a game.
+    """
+    text = header_block + "\n" + movetext
+    game = chess.pgn.read_game(io.StringIO(text))
+    if game is None:
+        return None
+
+    moves = []
+    evals = []
+    clocks = []
+    for node in game.mainline():
+        moves.append(node.move.uci())
+        eval_match = eval_pattern.search(node.comment)
+        evals.append(eval_match.group(1) if eval_match else None)
+        clocks.append(select_games.parse_time_remaining(node.comment))
+
+    return ParsedGame(text, header_block, dict(game.headers), moves, evals, clocks)
+
+
+class BatchReader:
+    """
+    Reads the raw games of a PGN file in batches.
+
+    Iterating yields the raw header block and movetext of the games of every batch, as list[tuple[str, str]].
+    Once all the batches have been read, end_of_file tells whether the whole file was read or the reading was stopped by total_games.
+
+    Args:
+        input_pgn_path (str): The file path of the PGN file.
+        batch_size (int): The number of games in a batch.
+        total_games (int or None): The maximum number of games to be read, None for the whole file.
+    """
+    def __init__(self, input_pgn_path, batch_size, total_games=None):
+        self.input_pgn_path = input_pgn_path
+        self.batch_size = batch_size
+        self.total_games = None if total_games is None else int(total_games)
+        self.end_of_file = False
+
+    def __iter__(self):
+        remaining = self.total_games
+        with open(self.input_pgn_path) as pgn_file:
+            games = select_games.read_raw_games(pgn_file)
+            while remaining is None or remaining > 0:
+                batch = list(islice(games, self.batch_size if remaining is None else min(self.batch_size, remaining)))
+                if not batch:
+                    self.end_of_file = True
+                    return
+                if remaining is not None:
+                    remaining -= len(batch)
+                yield batch
+
+            # stopped by total_games, a file holding exactly total_games games is still read through
+            self.end_of_file = next(games, None) is None
+
+
+def process_batch(batch, game_consumers):
+    """
+    Parses every game of a batch once and feeds it to all the consumers.
+
+    Args:
+        batch (list[tuple[str, str]]): The raw header block and movetext of the games in the batch.
+        game_consumers (list[consumers.Consumer]): The consumers the parsed games are fed to.
+
+    Returns:
+        list: The partial result of every consumer for the batch.
+    """
+    for header_block, movetext in batch:
+        game = parse_game(header_block, movetext)
+        if game is None:
+            continue
+        for consumer in game_consumers:
+            consumer.consume(game)
+
+    return [consumer.flush() for consumer in game_consumers]
+
+
+worker_consumers = None
+
+def init_worker(game_consumers):
+    global worker_consumers
+    worker_consumers = game_consumers
+
+def process_worker_batch(batch):
+    return len(batch), process_batch(batch, worker_consumers)
+
+
+def run_pipeline(input_pgn_path, game_consumers, num_workers=1, batch_size=1000, total_games=None):
+    """
+    Reads a PGN file once and feeds every parsed game to a list of consumers.
+
+    The games are parsed and consumed in batches by num_workers worker processes.
+    The partial results are merged in the main process in the order of the games in the file.
+    The consumers finish their outputs only if the whole scan succeeds, and abort them if it fails or is interrupted.
+    finish is told whether the end of the file was reached, or the scan was stopped by total_games.
+
+    Args:
+        input_pgn_path (str): The file path of the PGN file.
+        game_consumers (list[consumers.Consumer]): The consumers the parsed games are fed to.
+        num_workers (int): The number of worker processes, 1 to run everything in the main process.
+        batch_size (int): The number of games sent to a worker at once.
+        total_games (int or None): The maximum number of games to be read, None for the whole file.
+
+    Returns:
+        int: The number of games read.
+
+    Example:
+        run_pipeline("lichess.pgn", [consumers.PawnAccuracy("lichess.pgn")], num_workers=4)
+    """
+    batches = BatchReader(input_pgn_path, batch_size, total_games)
+    games_read = 0
+
+    try:
+        if num_workers > 1:
+            with Pool(num_workers, initializer=init_worker, initargs=(game_consumers,)) as pool:
+                # imap keeps the order of the batches for the merge
+                for batch_size_read, partials in pool.imap(process_worker_batch, batches):
+                    games_read += batch_size_read
+                    merge_partials(game_consumers, partials)
+                    print(games_read)
+        else:
+            for batch in batches:
+                games_read += len(batch)
+                merge_partials(game_consumers, process_batch(batch, game_consumers))
+                print(games_read)
+    except BaseException:
+        # KeyboardInterrupt included, the partial outputs are discarded
+        for consumer in game_consumers:
+            consumer.abort()
+        raise
+
+    # imap only stops once all the batches were read, so end_of_file is set
+    for consumer in game_consumers:
+        consumer.finish(batches.end_of_file)
+
+    return games_read
+
+def merge_partials(game_consumers, partials):
+    for consumer, partial in zip(game_consumers, partials):
+        consumer.merge(partial)
+
+
+if __name__ == "__main__":
+    # read the file path of the game database
+    with open(input_file,'r') as infile:
+        input_pgn_path = json.load(infile)
+
+    # consumers fed by the single scan of the dump
+    game_consumers = [
+        consumers.FilterWriter("../data/filtered.pgn"),
+        consumers.PawnAccuracy(input_pgn_path, total_games),
+        consumers.CsvEncoder("../text"),
+        consumers.ImageEncoder("../images"),
+    ]
+
+    run_pipeline(input_pgn_path, game_consumers, num_workers, batch_size, total_games)
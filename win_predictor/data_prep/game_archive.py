@@ -0,0 +1,212 @@
+import chess
+import chess.pgn
+import numpy as np
+from pathlib import Path
+import json
+import os
+
+# input/output file
+input_pgn_path = "../data/filtered.pgn"
+archive_path = Path("../data/filtered_archive")
+
+# the possible results, stored as their index
+results = ["1-0", "0-1", "1/2-1/2", "*"]
+
+# one row of the header table per game, the moves of a game are moves[offset:offset+length]
+game_dtype = np.dtype([
+    ("offset", "<i8"),
+    ("length", "<i4"),
+    ("result", "i1"),
+    ("white_elo", "<i2"),
+    ("black_elo", "<i2"),
+])
+
+# file names inside the archive folder
+moves_file = "moves.bin"
+games_file = "games.npy"
+source_file = "source.json"
+
+
+def encode_move(move: chess.Move) -> int:
+    """
+    Encode a move into 16 bits: 6 bits of the from square, 6 bits of the to square and 4 bits of the promotion piece type.
+
+    Args:
+        move (chess.Move): The move to encode.
+
+    Returns:
+        int: The encoded move.
+
+    Example:
+        encode_move(chess.Move.from_uci("e7e8q"))
+        # Output: 24372
+    """
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+def decode_moves(encoded: np.ndarray) -> list[chess.Move]:
+    """
+    Decode an array of 16 bit moves into chess.Move objects.
+
+    Args:
+        encoded (np.ndarray): The uint16 encoded moves.
+
+    Returns:
+        list[chess.Move]: The decoded moves.
+    """
+    encoded = encoded.astype(np.int64)
+    from_squares = (encoded & 0x3F).tolist()
+    to_squares = ((encoded >> 6) & 0x3F).tolist()
+    promotions = (encoded >> 12).tolist()
+    return [chess.Move(from_square, to_square, promotion or None)
+            for from_square, to_square, promotion in zip(from_squares, to_squares, promotions)]
+
+def parse_elo(value: str) -> int:
+    # unknown ratings are stored as 0
+    return int(value) if value.isdigit() else 0
+
+def source_fingerprint(input_pgn_path) -> dict:
+    # the size and modification time identify the version of the PGN file
+    stat = os.stat(input_pgn_path)
+    return {"source": os.path.basename(input_pgn_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def archive_up_to_date(input_pgn_path, archive_path) -> bool:
+    """
+    Checks whether an archive exists and was converted from the current version of the PGN file.
+
+    Args:
+        input_pgn_path (str): The file path of the PGN file.
+        archive_path (Path): The folder of the archive.
+
+    Returns:
+        bool: True if the archive can be used in place of the PGN file, False otherwise.
+    """
+    archive_path = Path(archive_path)
+    if not os.path.exists(archive_path / games_file) or not os.path.exists(archive_path / source_file):
+        return False
+    if not os.path.exists(input_pgn_path):
+        # nothing to compare with, the archive is all there is
+        return True
+    with open(archive_path / source_file) as source_in:
+        return json.load(source_in) == source_fingerprint(input_pgn_path)
+
+def convert_pgn_to_archive(input_pgn_path, archive_path) -> int:
+    """
+    Convert a PGN file into a compact binary archive, parsing the PGN text once.
+
+    The moves of all games are written one after another as uint16 into moves.bin.
+    The offset and number of moves, the result and the Elo ratings of every game are written into the header table games.npy.
+    The size and modification time of the PGN file are written into source.json, to detect an archive older than its PGN file.
+    source.json is removed first and written last, so an interrupted conversion never leaves an archive that looks up to date.
+
+    Args:
+        input_pgn_path (str): The file path of the PGN file.
+        archive_path (Path): The folder the archive is written to.
+
+    Returns:
+        int: The number of games in the archive.
+
+    Example:
+        convert_pgn_to_archive("../data/filtered.pgn", Path("../data/filtered_archive"))
+    """
+    archive_path = Path(archive_path)
+    if not os.path.exists(archive_path):
+        os.makedirs(archive_path)
+    if os.path.exists(archive_path / source_file):
+        os.remove(archive_path / source_file)
+
+    games = []
+    offset = 0
+
+    with open(input_pgn_path) as pgn_file, open(archive_path / moves_file, 'wb') as moves_out:
+        game = chess.pgn.read_game(pgn_file)
+        while game is not None:
+            encoded = np.array([encode_move(move) for move in game.mainline_moves()], dtype="<u2")
+            encoded.tofile(moves_out)
+
+            result = game.headers.get("Result", "*")
+            games.append((
+                offset,
+                len(encoded),
+                results.index(result) if result in results else results.index("*"),
+                parse_elo(game.headers.get("WhiteElo", "")),
+                parse_elo(game.headers.get("BlackElo", "")),
+            ))
+            offset += len(encoded)
+
+            if len(games) % 10000 == 0:
+                print(len(games))
+            game = chess.pgn.read_game(pgn_file)
+
+    np.save(archive_path / games_file, np.array(games, dtype=game_dtype))
+    with open(archive_path / source_file, 'w') as source_out:
+        json.dump(source_fingerprint(input_pgn_path), source_out, indent=2)
+
+    return len(games)
+
+class GameArchive:
+    """
+    Memory-mapped read access to an archive written by convert_pgn_to_archive.
+
+    Args:
+        archive_path (Path): The folder of the archive.
+
+    Example:
+        archive = GameArchive(Path("../data/filtered_archive"))
+        board = chess.Board()
+        for move in archive.moves(0):
+            board.push(move)
+    """
+    def __init__(self, archive_path) -> None:
+        archive_path = Path(archive_path)
+        self.games = np.load(archive_path / games_file, mmap_mode='r')
+        if (archive_path / moves_file).stat().st_size > 0:
+            self.encoded_moves = np.memmap(archive_path / moves_file, dtype="<u2", mode='r')
+        else:
+            self.encoded_moves = np.zeros(0, dtype="<u2")
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def result(self, game_number: int) -> str:
+        return results[self.games[game_number]["result"]]
+
+    def elos(self, game_number: int) -> tuple[int, int]:
+        game = self.games[game_number]
+        return int(game["white_elo"]), int(game["black_elo"])
+
+    def moves(self, game_number: int) -> list[chess.Move]:
+        game = self.games[game_number]
+        return decode_moves(self.encoded_moves[game["offset"]:game["offset"] + game["length"]])
+
+    def __iter__(self):
+        # yields the moves and the result of every game
+        for game_number in range(len(self)):
+            yield self.moves(game_number), self.result(game_number)
+
+def read_games(input_pgn_path, archive_path):
+    """
+    Iterates over the moves and results of the games, from the archive if it is up to date with the PGN file and from the PGN file otherwise.
+
+    Args:
+        input_pgn_path (str): The file path of the PGN file.
+        archive_path (Path): The folder of the archive.
+
+    Yields:
+        tuple[list[chess.Move], str]: The mainline moves and the result of a game.
+    """
+    if archive_up_to_date(input_pgn_path, archive_path):
+        yield from GameArchive(archive_path)
+        return
+
+    if os.path.exists(Path(archive_path) / games_file):
+        print(f"{archive_path} does not match {input_pgn_path}, reading the PGN file instead; rerun game_archive.py to update the archive")
+
+    with open(input_pgn_path) as pgn_file:
+        game = chess.pgn.read_game(pgn_file)
+        while game is not None:
+            yield list(game.mainline_moves()), game.headers.get("Result", "")
+            game = chess.pgn.read_game(pgn_file)
+
+if __name__ == "__main__":
+    num_games = convert_pgn_to_archive(input_pgn_path, archive_path)
+    print(num_games)
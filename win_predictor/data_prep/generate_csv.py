@@ -5,6 +5,8 @@ import pandas as pd
 from pathlib import Path
 import os
 
+import game_archive
+
 # Define the mappings
 piece_mapping_int = {
     'p': -1, 'b': -2, 'n': -3, 'r': -4, 'q': -5, 'k': -6,
@@ -28,6 +30,7 @@ piece_mapping_256 = {
 
 # input/output file
 input_pgn_path = "../data/filtered.pgn"
+input_archive_path = Path("../data/filtered_archive")
 root_output_folder = Path("../text")
 
 # games to be extracted from
@@ -73,25 +76,17 @@ def board_to_array(board_str: str, side_to_move: chess.Color) -> np.ndarray:
 
     return board_array
     
-def output_state(board: chess.Board, result: str, game_number: int, df : pd.DataFrame) -> None:
+def state_row(board: chess.Board, result: str, game_number: int) -> np.ndarray:
     """
-    Output the state of a chess board as an image file.
+    Convert the state of a chess board into a single row of the dataset.
 
     Args:
         board (chess.Board): The current state of the chess board.
         result (str): The result of the game.
-        output_folder (str): The path to the folder where the image file will be saved.
         game_number (int): The number of the game.
 
     Returns:
-        None
-
-    Example:
-        board = chess.Board()
-        result = "1-0"
-        output_folder = "../images/train/1"
-        game_number = 1
-        output_state(board, result, output_folder, game_number)
+        np.ndarray: The game number, the ply number, the 64 squares and whether the side to move wins.
     """
     # get side to move
     side_to_move = board.turn
@@ -109,32 +104,28 @@ def output_state(board: chess.Board, result: str, game_number: int, df : pd.Data
     flattened_board = board_array.flatten()
 
     # Data for the new row
-    new_row_data = np.concatenate(([game_number,ply_number],flattened_board,[side_wins]))
-
-    # Add new line to the DataFrame
-    df.loc[len(df)] = new_row_data
+    return np.concatenate(([game_number,ply_number],flattened_board,[side_wins]))
 
-def play_through_game(game, output_folder, game_number, df):
+def game_rows(moves, result: str, game_number: int) -> np.ndarray:
     """
-    Iterates through each move in a chess game and outputs the state of the chess board after each move.
+    Replays the moves of a chess game and converts the state after each move into a row of the dataset.
 
     Args:
-        game (chess.pgn.Game): The chess game to play through.
-        output_folder (str): The path to the folder where the image files will be saved.
+        moves (Iterable[chess.Move]): The mainline moves of the game.
+        result (str): The result of the game.
         game_number (int): The number of the game.
 
     Returns:
-        None
+        np.ndarray: A (n, 67) array with one row per ply, in the column order of the CSV files.
     """
     board = chess.Board()
-    result = game.headers.get("Result", "")
-    output_state(board, result, game_number, df)
+    rows = [state_row(board, result, game_number)]
 
-    for move in game.mainline_moves():
+    for move in moves:
         board.push(move)
-        output_state(board, result, game_number, df)
+        rows.append(state_row(board, result, game_number))
 
-    return
+    return np.stack(rows)
 
 if __name__ == "__main__":
 
@@ -144,28 +135,32 @@ if __name__ == "__main__":
     train_game_number = -1
     valid_game_number = -1
 
-    # Create Pandas DataFrames
     column_names = ['game_no','ply_no'] + [f'f_{i}' for i in range(1, 65)] + ['result']
-    train_df = pd.DataFrame(columns=column_names)
-    valid_df = pd.DataFrame(columns=column_names)
-
-    with open(input_pgn_path) as pgn_file:
-        game = chess.pgn.read_game(pgn_file)
-    
-        while game is not None and train_game_number < total_train_games:
-            train_game_number += 1
-            play_through_game(game, root_output_folder, train_game_number, train_df)
-            print(train_game_number, valid_game_number)
-            game = chess.pgn.read_game(pgn_file)
-                
-        # Save the DataFrame to a CSV file
-        train_df.to_csv(root_output_folder / "train.csv", index=False)
-    
-        while game is not None and valid_game_number < total_valid_games:
-            valid_game_number += 1
-            play_through_game(game, root_output_folder, valid_game_number, valid_df)
-            print(train_game_number, valid_game_number)
-            game = chess.pgn.read_game(pgn_file)
-                
-        # Save the DataFrame to a CSV file
-        valid_df.to_csv(root_output_folder / "valid.csv", index=False)
+    train_rows = []
+    valid_rows = []
+
+    # the games are replayed from the binary archive if it is up to date, see game_archive.py
+    games = game_archive.read_games(input_pgn_path, input_archive_path)
+    game = next(games, None)
+
+    while game is not None and train_game_number < total_train_games:
+        train_game_number += 1
+        moves, result = game
+        train_rows.append(game_rows(moves, result, train_game_number))
+        print(train_game_number, valid_game_number)
+        game = next(games, None)
+
+    # Save the DataFrame to a CSV file
+    train_df = pd.DataFrame(np.concatenate(train_rows) if train_rows else np.zeros((0, len(column_names)), dtype=int), columns=column_names)
+    train_df.to_csv(root_output_folder / "train.csv", index=False)
+
+    while game is not None and valid_game_number < total_valid_games:
+        valid_game_number += 1
+        moves, result = game
+        valid_rows.append(game_rows(moves, result, valid_game_number))
+        print(train_game_number, valid_game_number)
+        game = next(games, None)
+
+    # Save the DataFrame to a CSV file
+    valid_df = pd.DataFrame(np.concatenate(valid_rows) if valid_rows else np.zeros((0, len(column_names)), dtype=int), columns=column_names)
+    valid_df.to_csv(root_output_folder / "valid.csv", index=False)
@@ -3,8 +3,12 @@ import chess.pgn
 import numpy as np
 from PIL import Image
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import os
 
+import game_archive
+
 # Define the mappings
 piece_mapping_int = {
     'p': -1, 'b': -2, 'n': -3, 'r': -4, 'q': -5, 'k': -6,
@@ -28,12 +32,17 @@ piece_mapping_256 = {
 
 # input/output file
 input_pgn_path = "../data/filtered.pgn"
+input_archive_path = Path("../data/filtered_archive")
 root_output_folder = Path("../images")
 
 # games to be extracted from
 total_train_games = 2e2
 total_valid_games = 4e1
 
+# number of background PNG writers and the maximum number of pending images
+writer_threads = 4
+max_pending_images = 1024
+
 
 def board_to_array(board_str: str, side_to_move: chess.Color) -> np.ndarray:
     """
@@ -75,81 +84,119 @@ def board_to_array(board_str: str, side_to_move: chess.Color) -> np.ndarray:
     
 def array_to_rgb(original_array: np.ndarray) -> np.ndarray:
     """
-    Convert an input array into a 3D RGB array by assigning positive values to the red channel and negative values to the green channel.
+    Convert an input array into an RGB array by assigning positive values to the red channel and negative values to the green channel.
+
+    The conversion works on arrays of any shape, so a whole game stacked into an (n, 8, 8) array is converted at once into an (n, 8, 8, 3) array.
 
     Args:
         original_array: The input array containing numerical values.
 
     Returns:
-        A 3D RGB array where positive values are assigned to the red channel and negative values are assigned to the green channel.
+        An RGB array with one extra trailing channel axis, where positive values are assigned to the red channel and negative values are assigned to the green channel.
     """
-    # Create a mask for positive and negative values
-    positive_mask = original_array > 0
-    negative_mask = original_array < 0
-
-    # Create a 3D array with the specified conditions
     extended_array = np.zeros((*original_array.shape, 3), dtype=np.uint8)
-    extended_array[positive_mask, 0] = original_array[positive_mask]
-    extended_array[negative_mask, 1] = -original_array[negative_mask]
+    extended_array[..., 0] = np.clip(original_array, 0, 255)
+    extended_array[..., 1] = np.clip(-original_array, 0, 255)
 
     return extended_array
 
-def output_state(board: chess.Board, result: str, output_folder: str, game_number: int) -> None:
+class ImageWriter:
     """
-    Output the state of a chess board as an image file.
+    Encode and save PNG images on a bounded pool of background threads.
+
+    PNG encoding in PIL and the file writes release the GIL, so the main thread can keep replaying games while images are written.
+    At most max_pending images are queued at any time; submit blocks once the limit is reached to keep memory bounded.
 
     Args:
-        board (chess.Board): The current state of the chess board.
-        result (str): The result of the game.
-        output_folder (str): The path to the folder where the image file will be saved.
+        num_threads (int): The number of writer threads.
+        max_pending (int): The maximum number of images waiting to be written.
+
+    Example:
+        with ImageWriter(4, 1024) as writer:
+            writer.submit(rgb_array, "../images/train/1/0_0.png")
+    """
+    def __init__(self, num_threads: int, max_pending: int) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=num_threads)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.errors = []
+
+    def _write(self, rgb_array: np.ndarray, path: Path) -> None:
+        try:
+            Image.fromarray(rgb_array).save(path)
+        except Exception as error:
+            self.errors.append(error)
+        finally:
+            self.slots.release()
+
+    def submit(self, rgb_array: np.ndarray, path: Path) -> None:
+        if self.errors:
+            raise self.errors[0]
+        self.slots.acquire()
+        self.executor.submit(self._write, rgb_array, path)
+
+    def close(self, raise_errors: bool = True) -> None:
+        # the write errors are not raised on top of an exception already being handled
+        self.executor.shutdown(wait=True)
+        if raise_errors and self.errors:
+            raise self.errors[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(raise_errors=exc_type is None)
+
+def output_states(board_arrays: np.ndarray, side_wins: np.ndarray, output_folder: Path, game_number: int, writer: ImageWriter) -> None:
+    """
+    Output the states of a whole chess game as image files.
+
+    Args:
+        board_arrays (np.ndarray): The (n, 8, 8) stacked board arrays of the game, one per ply.
+        side_wins (np.ndarray): The (n,) boolean array telling whether the side to move in a given ply wins.
+        output_folder (Path): The path to the folder where the image files will be saved.
         game_number (int): The number of the game.
+        writer (ImageWriter): The background writer the images are submitted to.
 
     Returns:
         None
 
     Example:
-        board = chess.Board()
-        result = "1-0"
-        output_folder = "../images/train/1"
+        board_arrays = np.stack([board_to_array(str(chess.Board()), chess.WHITE)])
+        side_wins = np.array([True])
+        output_folder = Path("../images/train")
         game_number = 1
-        output_state(board, result, output_folder, game_number)
+        with ImageWriter(4, 1024) as writer:
+            output_states(board_arrays, side_wins, output_folder, game_number, writer)
     """
-    # get side to move
-    side_to_move = board.turn
-
-    # get the current ply number
-    ply_number = board.ply()
+    # convert all the board states into images at once
+    rgb_arrays = array_to_rgb(board_arrays)
 
-    # get the side to win
-    side_wins = (result == "1-0" and side_to_move == chess.WHITE) or (result == "0-1" and side_to_move == chess.BLACK)
+    for ply_number, (rgb_array, wins) in enumerate(zip(rgb_arrays, side_wins)):
+        writer.submit(rgb_array, output_folder/str(int(wins))/f"{game_number}_{ply_number}.png")
 
-    # converthe board state into an image
-    board_array = board_to_array(str(board),side_to_move)
-    rgb_array = array_to_rgb(board_array)
-    image = Image.fromarray(rgb_array)
-    image.save(output_folder/str(int(side_wins))/f"{game_number}_{ply_number}.png")
-
-def play_through_game(game, output_folder, game_number):
+def game_arrays(moves, result: str) -> tuple[np.ndarray, np.ndarray]:
     """
-    Iterates through each move in a chess game and outputs the state of the chess board after each move.
+    Replays the moves of a chess game and stacks the board arrays of every ply.
 
     Args:
-        game (chess.pgn.Game): The chess game to play through.
-        output_folder (str): The path to the folder where the image files will be saved.
-        game_number (int): The number of the game.
+        moves (Iterable[chess.Move]): The mainline moves of the game.
+        result (str): The result of the game.
 
     Returns:
-        None
+        tuple[np.ndarray, np.ndarray]: The (n, 8, 8) stacked board arrays and the (n,) boolean array telling whether the side to move in a given ply wins.
     """
     board = chess.Board()
-    result = game.headers.get("Result", "")
-    output_state(board, result, output_folder, game_number)
+    board_arrays = [board_to_array(str(board), board.turn)]
 
-    for move in game.mainline_moves():
+    for move in moves:
         board.push(move)
-        output_state(board, result, output_folder, game_number)
+        board_arrays.append(board_to_array(str(board), board.turn))
 
-    return
+    # side to move alternates starting with white, ply number is the index
+    white_to_move = np.arange(len(board_arrays)) % 2 == 0
+    side_wins = (white_to_move & (result == "1-0")) | (~white_to_move & (result == "0-1"))
+
+    return np.stack(board_arrays), side_wins
 
 if __name__ == "__main__":
     train_folder = root_output_folder / "train"
@@ -168,17 +215,22 @@ if __name__ == "__main__":
     train_game_number = -1
     valid_game_number = -1
 
-    with open(input_pgn_path) as pgn_file:
-        game = chess.pgn.read_game(pgn_file)
+    # the games are replayed from the binary archive if it is up to date, see game_archive.py
+    games = game_archive.read_games(input_pgn_path, input_archive_path)
+
+    with ImageWriter(writer_threads, max_pending_images) as writer:
+        game = next(games, None)
     
         while game is not None and train_game_number < total_train_games:
             train_game_number += 1
-            play_through_game(game, train_folder, train_game_number)
+            moves, result = game
+            output_states(*game_arrays(moves, result), train_folder, train_game_number, writer)
             print(train_game_number, valid_game_number)
-            game = chess.pgn.read_game(pgn_file)
+            game = next(games, None)
     
         while game is not None and valid_game_number < total_valid_games:
             valid_game_number += 1
-            play_through_game(game, valid_folder, valid_game_number)
+            moves, result = game
+            output_states(*game_arrays(moves, result), valid_folder, valid_game_number, writer)
             print(train_game_number, valid_game_number)
-            game = chess.pgn.read_game(pgn_file)
+            game = next(games, None)
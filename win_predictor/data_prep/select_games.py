@@ -1,12 +1,12 @@
-import chess
-import chess.pgn
 import re
+import operator
 import numpy as np
 import json
 
 # input/output file
 input_file = "data_path.json"
 output_pgn_path = "../data/filtered.pgn"
+tag_file_path = "../data/tag_file"
 
 # games to be extracted from
 total_games = 1e4
@@ -15,6 +15,20 @@ starting_eval = str(0.3) # for consistency with the rest of evals
 
 pattern = re.compile(r"\[%clk\s(\d{1}:\d{2}:\d{2})\]")
 
+# patterns of the raw header block and of the tag file criteria
+header_pattern = re.compile(rb'^\[(\w+)\s+"(.*)"\]\s*$', re.MULTILINE)
+criterion_pattern = re.compile(r'^(\w+)\s*(<=|>=|<>|<|>|=)?\s*"(.*)"$')
+first_evaluation_pattern = re.compile(rb'^\s*1\.\s*\S+\s*\{\s*\[%eval\s')
+
+tag_operators = {
+    '=': operator.eq,
+    '<>': operator.ne,
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
 def parse_time_remaining(comment):
     """
     Parses the time remaining from a comment.
@@ -127,83 +141,192 @@ def move_accuracy(eval_old,eval,side_to_move):
         raw = 103.1668100711649 * np.exp(-0.04354415386753951*win_diff) -3.166924740191411
         return min(100,max(0,raw+1)) # + 1  uncertainty bonus (due to imperfect analysis)
     
-def game_selector(game):
+def load_tag_file(tag_file_path):
+    """
+    Loads selection criteria from a tag file in the syntax of pgn-extract.
+
+    Every line holds a tag name, an optional operator (=, <>, <, >, <=, >=) and a quoted value, e.g. WhiteElo >= "2000".
+    Lines starting with % are comments.
+
+    Args:
+        tag_file_path (str): The file path of the tag file.
+
+    Returns:
+        list[tuple[str, str, str]]: The tag name, the operator and the value of every criterion.
+
+    Raises:
+        ValueError: If a line of the tag file is not a valid criterion.
+    """
+    criteria = []
+    with open(tag_file_path) as tag_file:
+        for line_number, line in enumerate(tag_file, start=1):
+            line = line.strip()
+            if not line or line.startswith('%'):
+                continue
+            match = criterion_pattern.match(line)
+            if match is None:
+                raise ValueError(f"{tag_file_path}:{line_number}: invalid tag criterion: {line}")
+            tag, op, value = match.groups()
+            criteria.append((tag, op or '=', value))
+    return criteria
+
+def compile_criterion(op, value):
+    """
+    Compiles a single criterion into a predicate over the raw value of a tag.
+
+    Numeric values are compared as numbers, other values as strings.
+    A game without the tag never meets the criterion.
+
+    Args:
+        op (str): The operator of the criterion.
+        value (str): The value of the criterion.
+
+    Returns:
+        function: A function that takes the raw tag value (bytes or None) and returns True if it meets the criterion.
+    """
+    compare = tag_operators[op]
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+
+    if number is None:
+        expected = value.encode()
+        return lambda raw: raw is not None and compare(raw, expected)
+
+    def numeric_predicate(raw):
+        try:
+            return raw is not None and compare(float(raw), number)
+        except ValueError:
+            return False
+
+    return numeric_predicate
+
+def compile_tag_criteria(criteria):
+    """
+    Compiles tag file criteria into a predicate over the raw header block of a game.
+
+    The equality criteria on the same tag are alternatives, e.g. two Event lines select games of either event.
+    The relational criteria (<>, <, >, <=, >=) must all hold, so that ranges such as WhiteElo > "1700" and WhiteElo < "2000" can be expressed.
+    A game is selected if it meets at least one equality criterion for every tag named in them and all the relational criteria.
+
+    Args:
+        criteria (list[tuple[str, str, str]]): The criteria, as returned by load_tag_file.
+
+    Returns:
+        function: A function that takes the raw header block (bytes) of a game and returns True if the game is selected.
+
+    Example:
+        headers_match = compile_tag_criteria([("Event", "=", "Rated Rapid game"), ("WhiteElo", ">", "1700"), ("WhiteElo", "<", "2000")])
+        headers_match(b'[Event "Rated Rapid game"]\n[WhiteElo "1850"]\n')
+        # Output: True
     """
-    Determines whether a chess game meets certain criteria for selection.
+    alternatives = {}
+    relational = []
+    for tag, op, value in criteria:
+        predicate = compile_criterion(op, value)
+        if op == '=':
+            alternatives.setdefault(tag.encode(), []).append(predicate)
+        else:
+            relational.append((tag.encode(), predicate))
+    alternatives = list(alternatives.items())
+
+    def headers_match(header_block):
+        headers = dict(header_pattern.findall(header_block))
+        return all(
+            any(predicate(headers.get(tag)) for predicate in tag_predicates)
+            for tag, tag_predicates in alternatives
+        ) and all(predicate(headers.get(tag)) for tag, predicate in relational)
+
+    return headers_match
+
+def raw_first_evaluation(movetext):
+    """
+    Checks whether the first move of the raw movetext of a game carries an evaluation, without parsing the moves.
 
     Args:
-        game (chess.pgn.Game): The game object containing information about the chess game.
+        movetext (bytes): The raw movetext of the game.
 
     Returns:
-        bool: True if the game meets all the criteria and should be selected, False otherwise.
+        bool: True if the comment of the first move starts with an evaluation, as required by first_evaluation.
+    """
+    return first_evaluation_pattern.match(movetext) is not None
+
+def read_raw_games(pgn_file):
     """
-    event = game.headers.get("Event", "")
-    result = game.headers.get("Result", "")
-    white_elo = int(game.headers.get("WhiteElo", 0))
-    black_elo = int(game.headers.get("BlackElo", 0))
-    termination = game.headers.get("Termination", "")
+    Splits a PGN file into the raw header block and movetext of its games without parsing them.
+
+    Works on files opened both in text and in binary mode.
 
-    return (
-        event == "Rated Rapid game"
-        and termination == "Normal"
-        and result in ["0-1", "1-0"]
-        and 1700 < white_elo < 2000
-        and 1700 < black_elo < 2000
-        and first_evaluation(game) is not None
-    )
+    Args:
+        pgn_file (IO): The opened PGN file.
 
-def filter_and_write_to_pgn(input_pgn_path, output_pgn_path, condition_func):
+    Yields:
+        tuple: The header block and the movetext of a game, of the same type as the lines of the file.
     """
-    Filter and write chess games to a PGN file based on a given condition.
+    empty = pgn_file.read(0)
+    bracket = '[' if isinstance(empty, str) else b'['
+    header_lines = []
+    movetext_lines = []
+
+    for line in pgn_file:
+        # a tag name follows the bracket, a bracket starting a comment continuation is followed by %
+        if line[:1] == bracket and line[1:2].isalnum():
+            if movetext_lines:
+                yield empty.join(header_lines), empty.join(movetext_lines)
+                header_lines = []
+                movetext_lines = []
+            header_lines.append(line)
+        elif line.strip():
+            movetext_lines.append(line)
+
+    if header_lines or movetext_lines:
+        yield empty.join(header_lines), empty.join(movetext_lines)
+
+def filter_raw_and_write_to_pgn(input_pgn_path, output_pgn_path, headers_match, require_evaluation=True):
+    """
+    Filter and write chess games to a PGN file based on their raw header block, without parsing the moves.
+
+    The rejected games are never parsed and the selected games are copied byte for byte to the output file.
 
     Args:
         input_pgn_path (str): The file path of the input PGN file containing the chess games.
         output_pgn_path (str): The file path of the output PGN file to write the filtered games.
-        condition_func (function): A function that takes a chess game object as input and returns a boolean value indicating whether the game meets certain criteria for selection.
+        headers_match (function): A function that takes the raw header block (bytes) of a game and returns True if the game should be selected, e.g. from compile_tag_criteria.
+        require_evaluation (bool): Whether to select only games with an evaluation of the first move.
 
     Returns:
         None
 
-    Raises:
-        FileNotFoundError: If the input PGN file does not exist.
-
     Example:
-        filter_and_write_to_pgn("input.pgn", "output.pgn", game_selector)
-
-    Note:
-        The condition_func should be a function that takes a chess.pgn.Game object as input and returns True if the game meets the criteria and should be selected, False otherwise.
+        headers_match = compile_tag_criteria(load_tag_file("../data/tag_file"))
+        filter_raw_and_write_to_pgn("input.pgn", "output.pgn", headers_match)
     """
-    filtered_games = []
     iall = 0
     ievl = 0
 
-    with open(input_pgn_path) as pgn_file:
-        while ievl<total_games:
-            game = chess.pgn.read_game(pgn_file)
-            if game is None:
-                break  # No more games in the file
-            
+    with open(input_pgn_path, 'rb') as pgn_file, open(output_pgn_path, 'wb') as output_file:
+        for header_block, movetext in read_raw_games(pgn_file):
+            if ievl >= total_games:
+                break
+
             # increment counter
             iall += 1
 
-            # Apply your condition to filter games
-            if condition_func(game):
+            # check the headers first, the movetext only for games passing them
+            if headers_match(header_block) and (not require_evaluation or raw_first_evaluation(movetext)):
                 ievl += 1
-                filtered_games.append(game)
-                print(iall,ievl)
+                output_file.write(header_block + b'\n' + movetext + b'\n')
 
             # print status
-            #if ievl % 1000 == 0:
-            #    print(iall,ievl)
-
-    # Write the filtered games to the output PGN file
-    with open(output_pgn_path, 'w') as output_file:
-        for game in filtered_games:
-            output_file.write(str(game) + '\n\n')
+            if iall % 100000 == 0:
+                print(iall,ievl)
 
 if __name__ == "__main__":
     # read the file path of the game database
     with open(input_file,'r') as infile:
         input_pgn_path = json.load(infile)
 
-    filter_and_write_to_pgn(input_pgn_path, output_pgn_path, game_selector)
\ No newline at end of file
+    # the selection is read from the tag file, edit the tag file to change it
+    headers_match = compile_tag_criteria(load_tag_file(tag_file_path))
+    filter_raw_and_write_to_pgn(input_pgn_path, output_pgn_path, headers_match)
\ No newline at end of file